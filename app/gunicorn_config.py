@@ -1,54 +1,94 @@
 """Gunicorn configuration with JSON logging."""
-import json
-import datetime
+import io
+import os
+import sys
+from datetime import datetime as _dt
+
+import orjson
 
 # Server settings
 bind = "0.0.0.0:8080"
-workers = 2
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+
+# Threaded workers so a request sleeping in /api/slow doesn't park the whole process
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+keepalive = 30
+
+# Time a worker gets after SIGTERM to finish in-flight requests and flush telemetry
+# (the flush itself is capped at 5s in main._shutdown_telemetry)
+graceful_timeout = 10
+
+# Import the app in the master so workers share its pages copy-on-write
+preload_app = True
 
 # Disable default access log (we use custom JSON format in post_request)
 accesslog = None
 errorlog = "-"
 loglevel = "info"
 
-def get_header(headers, name, default="-"):
-    """Get header value from gunicorn headers list."""
-    for header_name, header_value in headers:
-        if header_name.lower() == name.lower():
-            return header_value
-    return default
+# Same as main._JSON_OPTIONS; not imported so loading the config doesn't import the app
+_JSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+# Fields shared by every access log line, pre-encoded as the opening of the JSON object
+_ACCESS_LOG_PREFIX = orjson.dumps({
+    "level": "INFO",
+    "service": "sample-app",
+    "logger": "gunicorn.access",
+})[:-1] + b","
+
+# Line-buffered stdout: the trailing newline flushes, so no explicit flush per record.
+# Workers inherit this stream, so the app's JSON handler shares the same buffering.
+if isinstance(sys.stdout, io.TextIOWrapper):
+    sys.stdout.reconfigure(line_buffering=True, write_through=False)
+
+def _write_line(line):
+    """Write one encoded JSON log line to stdout."""
+    sys.stdout.write(line.decode() + "\n")
+
+def _emit(log_data):
+    """Serialize and write one JSON log line."""
+    _write_line(orjson.dumps(log_data, option=_JSON_OPTIONS))
 
 def post_request(worker, req, environ, resp):
     """Log each request in JSON format."""
     status_code = resp.status.split()[0] if hasattr(resp, 'status') else "200"
+    # Only the per-request fields are encoded; the static prefix replaces their opening brace
     log_data = {
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
-        "level": "INFO",
-        "service": "sample-app",
-        "logger": "gunicorn.access",
+        "timestamp": _dt.utcnow(),
         "message": f"{req.method} {req.path} {status_code}",
         "http": {
             "method": req.method,
             "path": req.path,
             "status_code": int(status_code),
-            "user_agent": get_header(req.headers, "User-Agent"),
+            "user_agent": environ.get("HTTP_USER_AGENT", "-"),
         },
         "network": {
             "client_ip": environ.get("REMOTE_ADDR", "-"),
         }
     }
-    print(json.dumps(log_data), flush=True)
+    _write_line(_ACCESS_LOG_PREFIX + orjson.dumps(log_data, option=_JSON_OPTIONS)[1:])
+
+def post_fork(server, worker):
+    """Start OTLP exporters and log threads inside each worker, never across fork."""
+    from main import _init_telemetry
+    _init_telemetry()
+
+def worker_exit(server, worker):
+    """Flush OTLP spans and logs before the worker process exits."""
+    from main import _shutdown_telemetry
+    _shutdown_telemetry()
 
 def on_starting(server):
     """Log when server starts."""
     log_data = {
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "timestamp": _dt.utcnow(),
         "level": "INFO", 
         "service": "sample-app",
         "logger": "gunicorn",
         "message": "Gunicorn server starting",
         "workers": workers,
+        "threads": threads,
         "bind": bind
     }
-    print(json.dumps(log_data), flush=True)
-
+    _emit(log_data)
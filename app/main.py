@@ -3,102 +3,499 @@ Sample Flask application with OpenTelemetry instrumentation.
 Maximum observability: every trace has multiple correlated logs.
 """
 
+import atexit
+import contextvars
 import datetime
+import gzip
+import hashlib
+import itertools
 import logging
 import os
+import queue
 import random
+import signal
 import sys
+import threading
 import time
-import uuid
-from flask import Flask, jsonify, request, g, render_template_string
+import traceback
+from contextlib import nullcontext
+from typing import Any, Callable
+from urllib.parse import urlparse
+from logging.handlers import QueueHandler, QueueListener
+from flask import Flask, Response, request, g
+from flask.json.provider import JSONProvider
 
 # JSON logging
-from pythonjsonlogger import jsonlogger
+import orjson
 
 # OpenTelemetry imports
 from opentelemetry import trace
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
-from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.proto.collector.logs.v1.logs_service_pb2_grpc import LogsServiceStub
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2_grpc import TraceServiceStub
+from opentelemetry.exporter.otlp.proto.grpc.exporter import _get_credentials
+from opentelemetry.sdk.environment_variables import (
+    OTEL_EXPORTER_OTLP_CERTIFICATE,
+    OTEL_EXPORTER_OTLP_CLIENT_CERTIFICATE,
+    OTEL_EXPORTER_OTLP_CLIENT_KEY,
+)
+from grpc import Channel, Compression, insecure_channel, secure_channel
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBasedTraceIdRatio
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler, LogRecordProcessor
 from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
 from opentelemetry._logs import set_logger_provider
+from opentelemetry.util.types import AttributeValue
 
-# Configure OpenTelemetry Resource with Datadog Unified Service Tagging
-resource = Resource.create({
-    # Standard OTEL attributes
-    "service.name": os.getenv("DD_SERVICE", os.getenv("OTEL_SERVICE_NAME", "sample-app")),
-    "service.version": os.getenv("DD_VERSION", "1.0.0"),
-    "deployment.environment": os.getenv("DD_ENV", os.getenv("OTEL_ENVIRONMENT", "demo")),
-    
-    # Host/container info for infrastructure correlation
-    "host.name": os.getenv("NODE_NAME", os.getenv("HOSTNAME", "local")),
-    "container.id": os.getenv("HOSTNAME", ""),  # In K8s, HOSTNAME is usually the pod name
-    "k8s.pod.name": os.getenv("POD_NAME", os.getenv("HOSTNAME", "")),
-    "k8s.namespace.name": os.getenv("POD_NAMESPACE", "otel-demo"),
-    "k8s.node.name": os.getenv("NODE_NAME", ""),
-})
+# Deployment settings, read once at import
+_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://otel-collector:4317")
+_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "sample-app")
+_ENVIRONMENT = os.getenv("OTEL_ENVIRONMENT", "demo")
+_HOSTNAME = os.getenv("HOSTNAME", "")  # In K8s, HOSTNAME is usually the pod name
 
-# OTLP endpoint
-otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://otel-collector:4317")
-
-# Set up tracer provider
-trace.set_tracer_provider(TracerProvider(resource=resource))
+# Proxies to the real tracer once _init_telemetry() installs the provider
 tracer = trace.get_tracer(__name__, "1.0.0")
+# Bound once so opening a span in a handler skips the attribute/enum lookups
+_start = tracer.start_as_current_span
+_INTERNAL = trace.SpanKind.INTERNAL
+_CLIENT = trace.SpanKind.CLIENT
+
+# Head-sampling ratio for new traces (OTEL_TRACES_SAMPLER_ARG)
+_SAMPLE_RATIO = float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "1.0"))
+
+# Filler child spans (validation, transform, slow phases, ...) that only wrap a short sleep
+# are opt-in; by default their attributes and events land on the enclosing span.
+_VERBOSE_SPANS = os.getenv("OTEL_VERBOSE_SPANS", "0") == "1"
+
+
+def _maybe_span(name):
+    """Start a child span when OTEL_VERBOSE_SPANS=1, else yield the current span."""
+    if _VERBOSE_SPANS:
+        return _start(name)
+    return nullcontext(trace.get_current_span())
+
+# (span_id, trace_id hex, span_id hex) of the latest span started in this context
+_span_ids_hex: contextvars.ContextVar[tuple[int, str, str] | None] = contextvars.ContextVar(
+    "span_ids_hex", default=None
+)
+
+
+class TraceCtxCachingProcessor(SpanProcessor):
+    """Formats trace/span ids once per span so log records only read the cached strings."""
+
+    def on_start(self, span, parent_context=None):
+        ctx = span.get_span_context()
+        if ctx is None:
+            return
+        _span_ids_hex.set((
+            ctx.span_id,
+            ctx.trace_id.to_bytes(16, "big").hex(),
+            ctx.span_id.to_bytes(8, "big").hex(),
+        ))
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        # Nothing is buffered; the base returns None, which TracerProvider.force_flush
+        # reads as a timeout and stops before reaching the export processors
+        return True
+
+
+def _span_ids_for(ctx):
+    """Return (trace_id hex, span_id hex) for a valid span context.
 
-# Configure OTLP trace exporter
-otlp_trace_exporter = OTLPSpanExporter(endpoint=otlp_endpoint, insecure=True)
-span_processor = BatchSpanProcessor(otlp_trace_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
+    The cache is stale once a child span ends, so it is only trusted on a span_id match.
+    """
+    cached = _span_ids_hex.get()
+    if cached is not None and cached[0] == ctx.span_id:
+        return cached[1], cached[2]
+    return ctx.trace_id.to_bytes(16, "big").hex(), ctx.span_id.to_bytes(8, "big").hex()
 
-# Set up logger provider for OTLP log export
-logger_provider = LoggerProvider(resource=resource)
-set_logger_provider(logger_provider)
 
-# Configure OTLP log exporter
-otlp_log_exporter = OTLPLogExporter(endpoint=otlp_endpoint, insecure=True)
-logger_provider.add_log_record_processor(BatchLogRecordProcessor(otlp_log_exporter))
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
 
-# Create OTEL logging handler - it automatically includes extra fields as OTLP attributes
-# via LoggingHandler._get_attributes() which extracts all non-reserved fields from log records
-otel_handler = LoggingHandler(level=logging.DEBUG, logger_provider=logger_provider)
+# orjson renders naive datetimes as UTC with a trailing "Z"
+_JSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+# Fixed for the life of the process, so merged into each log record as-is
+_STATIC_LOG_FIELDS = {
+    "service": _SERVICE_NAME,
+    "environment": _ENVIRONMENT,
+}
+_utcfromtimestamp = datetime.datetime.utcfromtimestamp
 
 # Configure JSON logging format with trace correlation
-class CustomJsonFormatter(jsonlogger.JsonFormatter):
-    def add_fields(self, log_record, record, message_dict):
-        super(CustomJsonFormatter, self).add_fields(log_record, record, message_dict)
-        log_record['service'] = 'sample-app'
-        log_record['environment'] = os.getenv("OTEL_ENVIRONMENT", "demo")
-        log_record['level'] = record.levelname
+class CustomJsonFormatter(logging.Formatter):
+    def format(self, record):
+        log_record = {
+            'timestamp': _utcfromtimestamp(record.created),
+            'level': record.levelname,
+            'name': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                log_record[key] = value
+        if record.exc_info:
+            log_record['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            log_record['stack_info'] = self.formatStack(record.stack_info)
+
+        log_record.update(_STATIC_LOG_FIELDS)
         log_record['logger'] = record.name
-        log_record['timestamp'] = datetime.datetime.utcfromtimestamp(record.created).isoformat() + "Z"
         
-        # Inject standard OTLP trace context
-        span = trace.get_current_span()
-        if span and span.get_span_context().is_valid:
-            ctx = span.get_span_context()
-            log_record['trace_id'] = format(ctx.trace_id, '032x')
-            log_record['span_id'] = format(ctx.span_id, '016x')
+        # Inject standard OTLP trace context of the active (possibly child) span
+        ctx = trace.get_current_span().get_span_context()
+        if ctx.is_valid:
+            log_record['trace_id'], log_record['span_id'] = _span_ids_for(ctx)
+
+        return orjson.dumps(log_record, default=str, option=_JSON_OPTIONS).decode()
+
+
+# Hand records to a background thread so request threads only pay for a queue put.
+# A snapshot of the caller's contextvars (OTel context and cached span ids) travels
+# with each record so trace_id/span_id still resolve on the listener thread.
+class TraceContextQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Records never leave the process, so skip QueueHandler's default format-and-copy:
+        # merge args now (they may be mutated after the call returns) and leave JSON and
+        # exception formatting to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        record._context = contextvars.copy_context()
+        return record
+
+
+class TraceContextQueueListener(QueueListener):
+    def handle(self, record):
+        ctx = record.__dict__.pop("_context", None)
+        if ctx is None:
+            super().handle(record)
+        else:
+            ctx.run(super().handle, record)
+
+
+# Keepalive pings stop idle NATs/LBs from silently dropping the export connection;
+# a local subchannel pool keeps each exporter on its own connection.
+_GRPC_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+_COMPRESSION_BY_NAME = {
+    "gzip": Compression.Gzip,
+    "deflate": Compression.Deflate,
+    "none": Compression.NoCompression,
+}
+
+
+def _compression_from_env():
+    """Read OTEL_EXPORTER_OTLP_COMPRESSION (default gzip) as a gRPC Compression."""
+    name = os.getenv("OTEL_EXPORTER_OTLP_COMPRESSION", "gzip").strip().lower()
+    try:
+        return _COMPRESSION_BY_NAME[name]
+    except KeyError:
+        raise ValueError(
+            f"OTEL_EXPORTER_OTLP_COMPRESSION must be one of {', '.join(_COMPRESSION_BY_NAME)}, got {name!r}"
+        ) from None
+
+
+class _ChannelOptionsMixin:
+    """Build an OTLP exporter's stub over a gRPC channel with _GRPC_CHANNEL_OPTIONS.
+
+    The pinned OTLP exporters (1.27) take no channel options: their __init__ opens a
+    channel itself and hands it to ``self._stub``. This mixin's ``_stub`` closes that
+    unused channel and builds the service stub over one that has the options. The
+    channel type follows the exporter's own choice: TLS for an https:// endpoint,
+    with the same OTEL_EXPORTER_OTLP_* certificate settings, and plaintext otherwise.
+    """
+
+    # Set by the concrete exporter class and its __init__
+    _service_stub: Callable[[Channel], Any]
+    _compression: Compression
+    _secure: bool
+    # Parsed from the endpoint URL by the OTLP exporter before its channel is built
+    _endpoint: str
+
+    def _init_channel_settings(self, endpoint: str, compression: Compression) -> None:
+        self._compression = compression
+        # Same rule the OTLP exporter applies when it is passed insecure=True
+        self._secure = urlparse(endpoint).scheme == "https"
+
+    def _stub(self, channel: Channel) -> Any:
+        channel.close()
+        if self._secure:
+            credentials = _get_credentials(
+                None,
+                OTEL_EXPORTER_OTLP_CERTIFICATE,
+                OTEL_EXPORTER_OTLP_CLIENT_KEY,
+                OTEL_EXPORTER_OTLP_CLIENT_CERTIFICATE,
+            )
+            return self._service_stub(secure_channel(
+                self._endpoint, credentials, options=_GRPC_CHANNEL_OPTIONS, compression=self._compression
+            ))
+        return self._service_stub(
+            insecure_channel(self._endpoint, options=_GRPC_CHANNEL_OPTIONS, compression=self._compression)
+        )
+
+
+class KeepaliveOTLPSpanExporter(_ChannelOptionsMixin, OTLPSpanExporter):
+    _service_stub = TraceServiceStub
+
+    def __init__(self, endpoint: str, compression: Compression) -> None:
+        self._init_channel_settings(endpoint, compression)
+        super().__init__(endpoint=endpoint, insecure=True, compression=compression)
+
+
+class KeepaliveOTLPLogExporter(_ChannelOptionsMixin, OTLPLogExporter):
+    _service_stub = LogsServiceStub
+
+    def __init__(self, endpoint: str, compression: Compression) -> None:
+        self._init_channel_settings(endpoint, compression)
+        super().__init__(endpoint=endpoint, insecure=True, compression=compression)
+
+
+def _shutdown_pool(processors):
+    """Shut down pooled batch processors side by side.
+
+    Each shutdown joins its worker, which can sit in exporter retries; one at a time,
+    the rest would still be open (and flushed again by logging.shutdown) behind it.
+    """
+    threads = [threading.Thread(target=processor.shutdown, daemon=True) for processor in processors]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _flush_pool(processors, timeout_millis):
+    """Force-flush pooled batch processors side by side under one shared deadline.
+
+    Returns True only if every processor finished flushing within timeout_millis.
+    """
+    results = [False] * len(processors)
+
+    def flush(index, processor):
+        results[index] = bool(processor.force_flush(timeout_millis))
+
+    threads = [
+        threading.Thread(target=flush, args=(index, processor), daemon=True)
+        for index, processor in enumerate(processors)
+    ]
+    deadline = time.monotonic() + timeout_millis / 1e3
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    return all(results)
+
+
+class RoundRobinSpanProcessor(SpanProcessor):
+    """Hand each finished span to the next processor in the pool."""
+
+    def __init__(self, processors):
+        self._processors = processors
+        self._counter = itertools.count()
+
+    def on_end(self, span):
+        self._processors[next(self._counter) % len(self._processors)].on_end(span)
+
+    def shutdown(self):
+        _shutdown_pool(self._processors)
 
-# Set up JSON formatter
-json_formatter = CustomJsonFormatter('%(timestamp)s %(level)s %(name)s %(message)s')
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return _flush_pool(self._processors, timeout_millis)
 
-# Configure root logger
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.DEBUG)
 
-for handler in root_logger.handlers[:]:
-    root_logger.removeHandler(handler)
+class RoundRobinLogRecordProcessor(LogRecordProcessor):
+    """Hand each log record to the next processor in the pool."""
+
+    def __init__(self, processors):
+        self._processors = processors
+        self._counter = itertools.count()
+
+    def emit(self, log_data):
+        self._processors[next(self._counter) % len(self._processors)].emit(log_data)
+
+    def shutdown(self):
+        _shutdown_pool(self._processors)
+
+    # The SDK base is unannotated (so inferred as None) but documents a bool result, which
+    # SynchronousMultiLogRecordProcessor relies on
+    def force_flush(self, timeout_millis: int = 30000) -> bool:  # pyright: ignore[reportIncompatibleMethodOverride]
+        return _flush_pool(self._processors, timeout_millis)
+
+
+def _env_int(name, default):
+    """Read an integer setting from the environment."""
+    return int(os.getenv(name, default))
+
+
+def _env_log_level(name, default):
+    """Read a logging level name (e.g. "INFO") from the environment as its int value."""
+    value = os.getenv(name, default)
+    level = logging.getLevelName(value.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"{name} must be a logging level name, got {value!r}")
+    return level
+
+
+# Upper bound on flushing telemetry at exit; kept under gunicorn's graceful_timeout
+# so an unreachable collector cannot hold a worker open until it is SIGKILLed.
+_SHUTDOWN_TIMEOUT_S = 5
+
+# Filled by _init_telemetry, run in order by _shutdown_telemetry
+_shutdown_steps = []
+
+
+def _run_shutdown_steps():
+    """Run each shutdown step, carrying on to the next if one fails."""
+    for step in _shutdown_steps:
+        try:
+            step()
+        except Exception:
+            # Logging is being torn down, so report straight to stderr
+            print(f"Telemetry shutdown step {step!r} failed:", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+
+
+# Set once _shutdown_telemetry has run in this process
+_TELEMETRY_SHUT_DOWN = False
+
+
+def _shutdown_telemetry():
+    """Flush queued logs, then the OTLP log and span pipelines, within _SHUTDOWN_TIMEOUT_S.
+
+    Safe to call more than once; runs from the gunicorn worker_exit hook and at exit.
+    """
+    global _TELEMETRY_SHUT_DOWN
+    if _TELEMETRY_SHUT_DOWN:
+        return
+    _TELEMETRY_SHUT_DOWN = True
+    # Exporter retries against a dead collector can run far past the timeout, so the
+    # steps run on a daemon thread that is abandoned if it overruns
+    worker = threading.Thread(target=_run_shutdown_steps, name="telemetry-shutdown", daemon=True)
+    worker.start()
+    worker.join(_SHUTDOWN_TIMEOUT_S)
+
+
+# Set once _init_telemetry has run in this process
+_TELEMETRY_INITIALISED = False
+
+
+def _init_telemetry():
+    """Set up OTLP trace/log export and JSON logging, once per process.
+
+    Under gunicorn this runs from the post_fork hook so exporter channels and
+    background threads are created in each worker rather than in the master.
+    """
+    global _TELEMETRY_INITIALISED
+    if _TELEMETRY_INITIALISED:
+        return
+    _TELEMETRY_INITIALISED = True
+
+    # Configure OpenTelemetry Resource with Datadog Unified Service Tagging
+    resource = Resource.create({
+        # Standard OTEL attributes
+        "service.name": os.getenv("DD_SERVICE", _SERVICE_NAME),
+        "service.version": os.getenv("DD_VERSION", "1.0.0"),
+        "deployment.environment": os.getenv("DD_ENV", _ENVIRONMENT),
+        
+        # Host/container info for infrastructure correlation
+        "host.name": os.getenv("NODE_NAME", _HOSTNAME or "local"),
+        "container.id": _HOSTNAME,
+        "k8s.pod.name": os.getenv("POD_NAME", _HOSTNAME),
+        "k8s.namespace.name": os.getenv("POD_NAMESPACE", "otel-demo"),
+        "k8s.node.name": os.getenv("NODE_NAME", ""),
+    })
+
+    # Head sampling: unsampled spans short-circuit to NonRecordingSpan.
+    # Defaults to keeping every trace; lower OTEL_TRACES_SAMPLER_ARG under load.
+    sampler = ParentBasedTraceIdRatio(_SAMPLE_RATIO)
+
+    # Set up tracer provider
+    # shutdown_on_exit=False: _shutdown_telemetry owns the (bounded) exit flush
+    tracer_provider = TracerProvider(resource=resource, sampler=sampler, shutdown_on_exit=False)
+    trace.set_tracer_provider(tracer_provider)
+    tracer_provider.add_span_processor(TraceCtxCachingProcessor())
+
+    # OTLP payload compression; gzip by default since batches repeat the same keys
+    compression = _compression_from_env()
+
+    # Number of OTLP export channels per signal. A batch processor exports one batch at a
+    # time over one connection, so the pool is of processors, not just exporters.
+    pool_size = max(1, _env_int("OTEL_OTLP_POOL_SIZE", 4))
+
+    # Configure OTLP trace exporters: a pool of batch processors, each exporting over its own channel
+    tracer_provider.add_span_processor(RoundRobinSpanProcessor([
+        BatchSpanProcessor(
+            KeepaliveOTLPSpanExporter(_OTLP_ENDPOINT, compression),
+            max_queue_size=_env_int("OTEL_BSP_MAX_QUEUE_SIZE", 4096),
+            max_export_batch_size=_env_int("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", 256),
+            schedule_delay_millis=_env_int("OTEL_BSP_SCHEDULE_DELAY", 1000),
+            export_timeout_millis=_env_int("OTEL_BSP_EXPORT_TIMEOUT", 10000),
+        )
+        for _ in range(pool_size)
+    ]))
+
+    # Set up logger provider for OTLP log export
+    logger_provider = LoggerProvider(resource=resource, shutdown_on_exit=False)
+    set_logger_provider(logger_provider)
+
+    # Configure OTLP log exporters, pooled the same way
+    logger_provider.add_log_record_processor(RoundRobinLogRecordProcessor([
+        BatchLogRecordProcessor(
+            KeepaliveOTLPLogExporter(_OTLP_ENDPOINT, compression),
+            max_queue_size=_env_int("OTEL_BLRP_MAX_QUEUE_SIZE", 4096),
+            max_export_batch_size=_env_int("OTEL_BLRP_MAX_EXPORT_BATCH_SIZE", 256),
+            schedule_delay_millis=_env_int("OTEL_BLRP_SCHEDULE_DELAY", 1000),
+            export_timeout_millis=_env_int("OTEL_BLRP_EXPORT_TIMEOUT", 10000),
+        )
+        for _ in range(pool_size)
+    ]))
+
+    # Create OTEL logging handler - it automatically includes extra fields as OTLP attributes
+    # via LoggingHandler._get_attributes() which extracts all non-reserved fields from log records.
+    # Only OTEL_LOG_LEVEL and above (default WARNING) cross the OTLP export path; lower levels
+    # stay on the stdout JSON handler.
+    otel_handler = LoggingHandler(
+        level=_env_log_level("OTEL_LOG_LEVEL", "WARNING"),
+        logger_provider=logger_provider,
+    )
+
+    # Configure root logger
+    root_logger = logging.getLogger()
+    # Handler debug logs are off unless LOG_LEVEL=DEBUG
+    root_logger.setLevel(_env_log_level("LOG_LEVEL", "INFO"))
+
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+
+    handlers: list[logging.Handler] = [otel_handler]
+    # stdout JSON is what the DD Agent collects, so it stays on unless LOG_STDOUT=0
+    if os.getenv("LOG_STDOUT", "1") == "1":
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(CustomJsonFormatter())
+        console_handler.setLevel(logging.DEBUG)
+        handlers.insert(0, console_handler)
+    else:
+        # Only OTLP is left, so drop records below its threshold before they are queued
+        root_logger.setLevel(max(root_logger.level, otel_handler.level))
+
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(TraceContextQueueHandler(log_queue))
+    log_listener = TraceContextQueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+
+    # Drain the log queue into the handlers before the OTLP pipelines are flushed
+    _shutdown_steps.extend((log_listener.stop, logger_provider.shutdown, tracer_provider.shutdown))
+    atexit.register(_shutdown_telemetry)
 
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(json_formatter)
-console_handler.setLevel(logging.DEBUG)
-root_logger.addHandler(console_handler)
-root_logger.addHandler(otel_handler)
 
 # Suppress noisy loggers
 logging.getLogger("urllib3").setLevel(logging.WARNING)
@@ -106,8 +503,21 @@ logging.getLogger("opentelemetry").setLevel(logging.WARNING)
 
 logger = logging.getLogger(__name__)
 
+
+class OrjsonProvider(JSONProvider):
+    """Serve jsonify() and request.get_json() through orjson instead of stdlib json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Create Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)  # compact, unsorted output (JSON_SORT_KEYS/JSONIFY_PRETTYPRINT_REGULAR are gone in Flask 3)
+app.config.update(TEMPLATES_AUTO_RELOAD=False)
 
 # HTML Template for Web UI
 HTML_TEMPLATE = '''
@@ -378,8 +788,8 @@ HTML_TEMPLATE = '''
                 <h3>GET /api/users</h3>
                 <p>Fetch users with database query simulation</p>
                 <div class="stats">
-                    <span class="stat stat-logs">📝 7 logs</span>
-                    <span class="stat stat-spans">🔗 4 spans</span>
+                    <span class="stat stat-logs">📝 3 logs</span>
+                    <span class="stat stat-spans">🔗 3 spans</span>
                 </div>
                 <button onclick="callEndpoint('/api/users')">Fetch Users</button>
             </div>
@@ -388,8 +798,8 @@ HTML_TEMPLATE = '''
                 <h3>GET /api/orders</h3>
                 <p>Process orders with auth and enrichment</p>
                 <div class="stats">
-                    <span class="stat stat-logs">📝 9 logs</span>
-                    <span class="stat stat-spans">🔗 6 spans</span>
+                    <span class="stat stat-logs">📝 4 logs</span>
+                    <span class="stat stat-spans">🔗 3 spans</span>
                 </div>
                 <button onclick="callEndpoint('/api/orders')">Get Orders</button>
             </div>
@@ -398,8 +808,8 @@ HTML_TEMPLATE = '''
                 <h3>GET /api/slow</h3>
                 <p>Simulate slow operation (0.5-2s delay)</p>
                 <div class="stats">
-                    <span class="stat stat-logs">📝 6 logs</span>
-                    <span class="stat stat-spans">🔗 4+ spans</span>
+                    <span class="stat stat-logs">📝 3 logs</span>
+                    <span class="stat stat-spans">🔗 2 spans</span>
                 </div>
                 <button class="slow-btn" onclick="callEndpoint('/api/slow')">Slow Request</button>
             </div>
@@ -408,8 +818,8 @@ HTML_TEMPLATE = '''
                 <h3>GET /error</h3>
                 <p>Trigger random error for error tracing</p>
                 <div class="stats">
-                    <span class="stat stat-logs">📝 6 logs</span>
-                    <span class="stat stat-spans">🔗 3 spans</span>
+                    <span class="stat stat-logs">📝 3 logs</span>
+                    <span class="stat stat-spans">🔗 2 spans</span>
                 </div>
                 <button class="error-btn" onclick="callEndpoint('/error')">Trigger Error</button>
             </div>
@@ -470,60 +880,199 @@ Check Datadog for:
 </html>
 '''
 
-# Instrument Flask
-FlaskInstrumentor().instrument_app(app)
-RequestsInstrumentor().instrument()
+# The page only depends on RUM env vars, so render it once at import rather than per request
+_RUM_APPLICATION_ID = os.getenv("DD_RUM_APPLICATION_ID", "")
+_RUM_CLIENT_TOKEN = os.getenv("DD_RUM_CLIENT_TOKEN", "")
+HTML_RESPONSE = app.jinja_env.from_string(HTML_TEMPLATE).render(
+    rum_enabled=bool(_RUM_APPLICATION_ID and _RUM_CLIENT_TOKEN),
+    rum_application_id=_RUM_APPLICATION_ID,
+    rum_client_token=_RUM_CLIENT_TOKEN,
+    dd_site=os.getenv("DD_SITE", "datadoghq.com"),
+)
+# Static page: compress once (mtime=0 keeps the bytes, and so the ETag, identical across
+# workers and pods) and let browsers revalidate instead of re-downloading
+HTML_BYTES = HTML_RESPONSE.encode("utf-8")
+HTML_GZ = gzip.compress(HTML_BYTES, compresslevel=9, mtime=0)
+HTML_ETAG = hashlib.md5(HTML_BYTES).hexdigest()
+HTML_GZ_ETAG = HTML_ETAG + "-gz"
+_HTML_CACHE_CONTROL = "public, max-age=300"
+
+# Static response data, serialized once at import instead of on every request
+_API_ENDPOINTS = ["/", "/api", "/api/users", "/api/orders", "/api/slow", "/error", "/health"]
+_STATIC_USERS = [
+    {"id": 1, "name": "Alice", "email": "alice@example.com", "active": True},
+    {"id": 2, "name": "Bob", "email": "bob@example.com", "active": True},
+    {"id": 3, "name": "Charlie", "email": "charlie@example.com", "active": True},
+]
+_STATIC_ORDERS = [
+    {"id": 101, "user_id": 1, "total": 99.99, "status": "shipped", "items": 3},
+    {"id": 102, "user_id": 2, "total": 149.50, "status": "pending", "items": 5},
+]
+_STATIC_ORDERS_TOTAL_VALUE = sum(o["total"] for o in _STATIC_ORDERS)
+_STATIC_ORDERS_TOTAL_ITEMS = sum(o["items"] for o in _STATIC_ORDERS)
+
+_API_HOME_JSON = orjson.dumps({
+    "message": "Welcome to the OTEL Demo App API!",
+    "endpoints": _API_ENDPOINTS,
+})
+_USERS_JSON = orjson.dumps({"users": _STATIC_USERS, "count": len(_STATIC_USERS)})
+_ORDERS_JSON = orjson.dumps({
+    "orders": _STATIC_ORDERS,
+    "summary": {
+        "count": len(_STATIC_ORDERS),
+        "total_value": _STATIC_ORDERS_TOTAL_VALUE,
+        "total_items": _STATIC_ORDERS_TOTAL_ITEMS,
+    },
+})
+_HEALTH_JSON = orjson.dumps({"status": "healthy", "service": "sample-app"})
+
+# Constant span attributes, handed to the span at creation instead of set per request
+_HOME_ATTRS: dict[str, AttributeValue] = {"handler.name": "home", "response.type": "html"}
+_API_HOME_ATTRS: dict[str, AttributeValue] = {"handler.name": "api_home", "response.endpoint_count": len(_API_ENDPOINTS)}
+_USERS_ATTRS: dict[str, AttributeValue] = {"handler.name": "get_users"}
+_USERS_DB_ATTRS: dict[str, AttributeValue] = {
+    "db.system": "postgresql",
+    "db.name": "users_db",
+    "db.operation": "SELECT",
+    "db.statement": "SELECT * FROM users WHERE active = true",
+    "db.rows_returned": len(_STATIC_USERS),
+}
+_ORDERS_ATTRS: dict[str, AttributeValue] = {"handler.name": "get_orders"}
+_ORDERS_DB_ATTRS: dict[str, AttributeValue] = {
+    "db.system": "postgresql",
+    "db.name": "orders_db",
+    "db.operation": "SELECT",
+    "db.statement": "SELECT * FROM orders WHERE status IN ('pending', 'shipped')",
+}
+# Constant log fields per call site, merged with the per-request ones at log time
+_USERS_QUERY_EXTRA = {
+    "db_system": "postgresql",
+    "db_operation": "SELECT",
+    "table": "users",
+    "rows_returned": len(_STATIC_USERS),
+}
+_AUTH_EXTRA = {"auth_method": "token", "auth_result": "success"}
+_ORDERS_QUERY_EXTRA = {"db_system": "postgresql", "table": "orders", "rows_returned": len(_STATIC_ORDERS)}
+_ORDERS_TOTALS_EXTRA = {
+    "total_value": _STATIC_ORDERS_TOTAL_VALUE,
+    "total_items": _STATIC_ORDERS_TOTAL_ITEMS,
+    "order_count": len(_STATIC_ORDERS),
+}
+_SLOW_START_EXTRA = {"handler": "slow_endpoint", "warning_type": "latency"}
+_SLOW_ATTRS: dict[str, AttributeValue] = {"handler.name": "slow_endpoint", "operation.type": "slow_simulation"}
+_ERROR_ATTRS: dict[str, AttributeValue] = {"handler.name": "error_endpoint", "error.simulated": True}
+# Exceptions /error picks from at random
+_ERR_TABLE = [
+    (ValueError, "Simulated validation error - invalid input data"),
+    (RuntimeError, "Simulated runtime error - service unavailable"),
+    (KeyError, "Simulated key error - missing configuration"),
+]
+
+
+def _json_with_request_id(body):
+    """Close a pre-serialized JSON object with the current request_id."""
+    return Response(
+        body[:-1] + b',"request_id":' + orjson.dumps(g.request_id) + b'}',
+        mimetype="application/json",
+    )
+
+
+def _json_response(payload, status=200):
+    """Serialize a per-request payload straight to bytes, skipping jsonify's str round-trip."""
+    return Response(orjson.dumps(payload), status=status, mimetype="application/json")
+
+
+# Private PRNG for request ids. Only the module-level instance is reseeded on fork,
+# so reseed this one per worker too.
+_rng = random.Random()
+os.register_at_fork(after_in_child=_rng.seed)
+_getrandbits = _rng.getrandbits
+_monotonic_ns = time.monotonic_ns
+
+# Simulated latencies are drawn once at import and replayed in a cycle, so requests pay
+# an index bump instead of a PRNG call and demo traces repeat the same timing pattern.
+_DELAY_TABLE_SIZE = 1024  # power of two, so the index wraps with a mask
+
+
+def _delay_table(low, high):
+    """Return a callable yielding precomputed durations in [low, high), round-robin."""
+    table = [_rng.uniform(low, high) for _ in range(_DELAY_TABLE_SIZE)]
+    counter = itertools.count()
+    mask = _DELAY_TABLE_SIZE - 1
+    return lambda: table[next(counter) & mask]
+
+
+_VALIDATE_DELAY = _delay_table(0.002, 0.005)
+_USERS_QUERY_DELAY = _delay_table(0.01, 0.05)
+_TRANSFORM_DELAY = _delay_table(0.001, 0.003)
+_AUTH_DELAY = _delay_table(0.003, 0.008)
+_ORDERS_QUERY_DELAY = _delay_table(0.02, 0.06)
+_ENRICH_DELAY = _delay_table(0.01, 0.02)
+_PRE_ERROR_DELAY = _delay_table(0.01, 0.02)
+_SLOW_DELAY = _delay_table(0.5, 2.0)
+
+
+def _simulate_work(span, next_delay):
+    """Sleep for the next delay from a _delay_table to mimic work, skipped for sampled-out spans."""
+    if span.is_recording():
+        time.sleep(next_delay())
+
+
+# Instrument Flask; Kubernetes probes hit /health constantly, so leave them untraced
+FlaskInstrumentor().instrument_app(
+    app, excluded_urls=os.getenv("OTEL_PYTHON_FLASK_EXCLUDED_URLS", "/health")
+)
 
 
 @app.before_request
 def before_request():
     """Log every incoming request with trace context."""
-    g.request_id = str(uuid.uuid4())[:8]
-    g.start_time = time.time()
+    # 8 hex chars; a log-correlation tag, so a non-cryptographic PRNG (no syscall) is enough
+    g.request_id = request_id = "%08x" % _getrandbits(32)
+    g.start_ns = _monotonic_ns()
     
     span = trace.get_current_span()
     if span:
-        span.set_attribute("http.request_id", g.request_id)
-        span.set_attribute("http.method", request.method)
-        span.set_attribute("http.route", request.path)
-        span.set_attribute("http.user_agent", request.headers.get("User-Agent", "unknown"))
-        span.add_event("request_received", {
-            "request_id": g.request_id,
-            "path": request.path
-        })
+        span.set_attribute("http.request_id", request_id)
     
-    logger.info("Request received", extra={
-        "event": "request_start",
-        "request_id": g.request_id,
-        "method": request.method,
-        "path": request.path,
-        "remote_addr": request.remote_addr,
-        "user_agent": request.headers.get("User-Agent", "unknown")
-    })
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Request received", extra={
+            "event": "request_start",
+            "request_id": request_id,
+            "method": request.method,
+            "path": request.path,
+            "handler": request.endpoint,
+            "remote_addr": request.remote_addr,
+            # Straight from the WSGI environ; EnvironHeaders.get would re-derive the key
+            "user_agent": request.environ.get("HTTP_USER_AGENT", "unknown")
+        })
 
 
 @app.after_request
 def after_request(response):
     """Log every response with duration and trace context."""
-    duration_ms = (time.time() - g.start_time) * 1000
+    duration_ms = (_monotonic_ns() - g.start_ns) / 1_000_000
     
     span = trace.get_current_span()
     if span:
-        span.set_attribute("http.status_code", response.status_code)
-        span.set_attribute("http.response_time_ms", round(duration_ms, 2))
-        span.add_event("response_sent", {
-            "status_code": response.status_code,
-            "duration_ms": round(duration_ms, 2)
-        })
+        span.set_attribute("http.response_time_ms", duration_ms)
     
-    logger.info("Request completed", extra={
-        "event": "request_end",
-        "request_id": g.request_id,
-        "method": request.method,
-        "path": request.path,
-        "status_code": response.status_code,
-        "duration_ms": round(duration_ms, 2)
-    })
+    # Handlers leave their result stats in g.log_summary instead of logging a separate
+    # "completed" record, so this is the single end-of-request log
+    if logger.isEnabledFor(logging.INFO):
+        extra = {
+            "event": "request_end",
+            "request_id": g.request_id,
+            "method": request.method,
+            "path": request.path,
+            "handler": request.endpoint,
+            "status_code": response.status_code,
+            "duration_ms": duration_ms
+        }
+        summary = g.get("log_summary")
+        if summary:
+            extra.update(summary)
+        logger.info("Request completed", extra=extra)
     
     return response
 
@@ -531,268 +1080,176 @@ def after_request(response):
 @app.route("/")
 def home():
     """Home page with web UI."""
-    with tracer.start_as_current_span("home-handler", kind=trace.SpanKind.INTERNAL) as span:
-        span.set_attribute("http.route", "/")
-        span.set_attribute("handler.name", "home")
-        span.set_attribute("response.type", "html")
-        
-        logger.info("Serving web UI", extra={
-            "request_id": g.request_id,
-            "handler": "home",
-            "response_type": "html"
-        })
-        
-        # RUM configuration
-        rum_app_id = os.getenv("DD_RUM_APPLICATION_ID", "")
-        rum_client_token = os.getenv("DD_RUM_CLIENT_TOKEN", "")
-        rum_enabled = bool(rum_app_id and rum_client_token)
-        
-        return render_template_string(
-            HTML_TEMPLATE,
-            rum_enabled=rum_enabled,
-            rum_application_id=rum_app_id,
-            rum_client_token=rum_client_token,
-            dd_site=os.getenv("DD_SITE", "datadoghq.com")
-        )
+    span = trace.get_current_span()
+    span.set_attributes(_HOME_ATTRS)
+    
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = Response(HTML_GZ, mimetype="text/html")
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(HTML_GZ_ETAG)
+    else:
+        response = Response(HTML_BYTES, mimetype="text/html")
+        response.set_etag(HTML_ETAG)
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = _HTML_CACHE_CONTROL
+    # Turns the response into a bodiless 304 when If-None-Match matches the ETag
+    return response.make_conditional(request)
 
 
 @app.route("/api")
 def api_home():
     """API home endpoint with JSON response."""
-    with tracer.start_as_current_span("api-home-handler", kind=trace.SpanKind.INTERNAL) as span:
-        span.set_attribute("http.route", "/api")
-        span.set_attribute("handler.name", "api_home")
-        
-        logger.info("Processing API home request", extra={
-            "request_id": g.request_id,
-            "handler": "api_home",
-            "action": "processing"
-        })
-        
-        endpoints = ["/", "/api", "/api/users", "/api/orders", "/api/slow", "/error", "/health"]
-        span.set_attribute("response.endpoint_count", len(endpoints))
-        
-        return jsonify({
-            "message": "Welcome to the OTEL Demo App API!",
-            "endpoints": endpoints,
-            "request_id": g.request_id
-        })
+    with _start("api-home-handler", kind=_INTERNAL, attributes=_API_HOME_ATTRS):
+        return _json_with_request_id(_API_HOME_JSON)
 
 
 @app.route("/api/users")
 def get_users():
     """Users endpoint with detailed database simulation."""
-    with tracer.start_as_current_span("users-handler", kind=trace.SpanKind.INTERNAL) as handler_span:
-        handler_span.set_attribute("http.route", "/api/users")
-        
-        logger.info("Starting user fetch operation", extra={
-            "request_id": g.request_id,
-            "handler": "get_users",
-            "action": "start"
-        })
-        
+    with _start("users-handler", kind=_INTERNAL, attributes=_USERS_ATTRS) as handler_span:
         # Validate request
-        with tracer.start_as_current_span("validate-request") as val_span:
+        with _maybe_span("validate-request") as val_span:
             val_span.set_attribute("validation.type", "user_request")
-            time.sleep(random.uniform(0.002, 0.005))
-            val_span.add_event("validation_complete", {"valid": True})
+            _simulate_work(val_span, _VALIDATE_DELAY)
             
-            logger.debug("Request validation passed", extra={
-                "request_id": g.request_id,
-                "validation": "passed"
-            })
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Request validation passed", extra={
+                    "request_id": g.request_id,
+                    "validation": "passed"
+                })
         
         # Query database
-        with tracer.start_as_current_span("db-query", kind=trace.SpanKind.CLIENT) as db_span:
-            db_span.set_attribute("db.system", "postgresql")
-            db_span.set_attribute("db.name", "users_db")
-            db_span.set_attribute("db.operation", "SELECT")
-            db_span.set_attribute("db.statement", "SELECT * FROM users WHERE active = true")
-            
-            query_start = time.time()
-            time.sleep(random.uniform(0.01, 0.05))
-            query_time = (time.time() - query_start) * 1000
+        with _start("db-query", kind=_CLIENT, attributes=_USERS_DB_ATTRS) as db_span:
+            query_start = _monotonic_ns()
+            _simulate_work(db_span, _USERS_QUERY_DELAY)
+            query_time = (_monotonic_ns() - query_start) / 1_000_000
             
-            db_span.set_attribute("db.query_time_ms", round(query_time, 2))
-            db_span.add_event("query_executed", {
-                "rows_returned": 3,
-                "query_time_ms": round(query_time, 2)
-            })
+            db_span.set_attribute("db.query_time_ms", query_time)
             
-            logger.info("Database query executed", extra={
-                "request_id": g.request_id,
-                "db_system": "postgresql",
-                "db_operation": "SELECT",
-                "table": "users",
-                "query_time_ms": round(query_time, 2),
-                "rows_returned": 3
-            })
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Database query executed", extra={
+                    "request_id": g.request_id,
+                    "query_time_ms": query_time,
+                    **_USERS_QUERY_EXTRA
+                })
             
-            users = [
-                {"id": 1, "name": "Alice", "email": "alice@example.com", "active": True},
-                {"id": 2, "name": "Bob", "email": "bob@example.com", "active": True},
-                {"id": 3, "name": "Charlie", "email": "charlie@example.com", "active": True},
-            ]
+            users = _STATIC_USERS
         
         # Transform data
-        with tracer.start_as_current_span("transform-data") as transform_span:
+        with _maybe_span("transform-data") as transform_span:
             transform_span.set_attribute("transform.input_count", len(users))
-            time.sleep(random.uniform(0.001, 0.003))
-            transform_span.add_event("transform_complete")
+            _simulate_work(transform_span, _TRANSFORM_DELAY)
             
-            logger.debug("Data transformation complete", extra={
-                "request_id": g.request_id,
-                "user_count": len(users)
-            })
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Data transformation complete", extra={
+                    "request_id": g.request_id,
+                    "user_count": len(users)
+                })
         
         handler_span.set_attribute("response.user_count", len(users))
+        g.log_summary = {"user_count": len(users)}
         
-        logger.info("User fetch completed successfully", extra={
-            "request_id": g.request_id,
-            "handler": "get_users",
-            "action": "complete",
-            "user_count": len(users)
-        })
-        
-        return jsonify({"users": users, "count": len(users), "request_id": g.request_id})
+        return _json_with_request_id(_USERS_JSON)
 
 
 @app.route("/api/orders")
 def get_orders():
     """Orders endpoint with complex nested operations."""
-    with tracer.start_as_current_span("orders-handler", kind=trace.SpanKind.INTERNAL) as handler_span:
-        handler_span.set_attribute("http.route", "/api/orders")
-        
-        logger.info("Starting order processing", extra={
-            "request_id": g.request_id,
-            "handler": "get_orders",
-            "action": "start"
-        })
-        
+    with _start("orders-handler", kind=_INTERNAL, attributes=_ORDERS_ATTRS) as handler_span:
         # Authentication check
-        with tracer.start_as_current_span("auth-check") as auth_span:
-            auth_span.set_attribute("auth.method", "token")
-            time.sleep(random.uniform(0.003, 0.008))
-            auth_span.add_event("auth_success", {"user_id": 1})
-            
-            logger.debug("Authentication verified", extra={
-                "request_id": g.request_id,
-                "auth_method": "token",
-                "auth_result": "success"
-            })
+        handler_span.add_event("auth-check", {"auth.method": "token"})
+        _simulate_work(handler_span, _AUTH_DELAY)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Authentication verified", extra={"request_id": g.request_id, **_AUTH_EXTRA})
         
         # Fetch orders from database
-        with tracer.start_as_current_span("db-query-orders", kind=trace.SpanKind.CLIENT) as db_span:
-            db_span.set_attribute("db.system", "postgresql")
-            db_span.set_attribute("db.name", "orders_db")
-            db_span.set_attribute("db.operation", "SELECT")
-            db_span.set_attribute("db.statement", "SELECT * FROM orders WHERE status IN ('pending', 'shipped')")
+        with _start("db-query-orders", kind=_CLIENT, attributes=_ORDERS_DB_ATTRS) as db_span:
+            query_start = _monotonic_ns()
+            _simulate_work(db_span, _ORDERS_QUERY_DELAY)
+            query_time = (_monotonic_ns() - query_start) / 1_000_000
             
-            query_start = time.time()
-            time.sleep(random.uniform(0.02, 0.06))
-            query_time = (time.time() - query_start) * 1000
+            db_span.set_attribute("db.query_time_ms", query_time)
             
-            db_span.set_attribute("db.query_time_ms", round(query_time, 2))
-            
-            logger.info("Orders query executed", extra={
-                "request_id": g.request_id,
-                "db_system": "postgresql",
-                "table": "orders",
-                "query_time_ms": round(query_time, 2),
-                "rows_returned": 2
-            })
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Orders query executed", extra={
+                    "request_id": g.request_id,
+                    "query_time_ms": query_time,
+                    **_ORDERS_QUERY_EXTRA
+                })
             
-            orders = [
-                {"id": 101, "user_id": 1, "total": 99.99, "status": "shipped", "items": 3},
-                {"id": 102, "user_id": 2, "total": 149.50, "status": "pending", "items": 5},
-            ]
+            orders = _STATIC_ORDERS
         
         # Enrich with user data
-        with tracer.start_as_current_span("enrich-user-data") as enrich_span:
-            enrich_span.set_attribute("enrichment.type", "user_details")
-            time.sleep(random.uniform(0.01, 0.02))
-            
+        handler_span.add_event("enrich-user-data", {"enrichment.type": "user_details"})
+        _simulate_work(handler_span, _ENRICH_DELAY)
+        
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug("Enriching orders with user data", extra={
                 "request_id": g.request_id,
                 "order_count": len(orders)
             })
         
         # Calculate totals
-        with tracer.start_as_current_span("calculate-totals") as calc_span:
-            total_value = sum(o["total"] for o in orders)
-            total_items = sum(o["items"] for o in orders)
-            calc_span.set_attribute("calculation.total_value", total_value)
-            calc_span.set_attribute("calculation.total_items", total_items)
-            
-            logger.info("Order totals calculated", extra={
-                "request_id": g.request_id,
-                "total_value": total_value,
-                "total_items": total_items,
-                "order_count": len(orders)
-            })
+        total_value = _STATIC_ORDERS_TOTAL_VALUE
+        total_items = _STATIC_ORDERS_TOTAL_ITEMS
+        handler_span.add_event("calculate-totals", {
+            "calculation.total_value": total_value,
+            "calculation.total_items": total_items
+        })
         
-        handler_span.set_attribute("response.order_count", len(orders))
-        handler_span.set_attribute("response.total_value", total_value)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Order totals calculated", extra={"request_id": g.request_id, **_ORDERS_TOTALS_EXTRA})
         
-        logger.info("Order processing completed", extra={
-            "request_id": g.request_id,
-            "handler": "get_orders",
-            "action": "complete",
-            "order_count": len(orders),
-            "total_value": total_value
+        handler_span.set_attributes({
+            "response.order_count": len(orders),
+            "response.total_value": total_value
         })
+        g.log_summary = {"order_count": len(orders), "total_value": total_value}
         
-        return jsonify({
-            "orders": orders,
-            "summary": {"count": len(orders), "total_value": total_value, "total_items": total_items},
-            "request_id": g.request_id
-        })
+        return _json_with_request_id(_ORDERS_JSON)
 
 
 @app.route("/api/slow")
 def slow_endpoint():
     """Slow endpoint demonstrating latency tracing."""
-    with tracer.start_as_current_span("slow-operation", kind=trace.SpanKind.INTERNAL) as span:
-        span.set_attribute("http.route", "/api/slow")
-        span.set_attribute("operation.type", "slow_simulation")
-        
-        delay = random.uniform(0.5, 2.0)
+    with _start("slow-operation", kind=_INTERNAL, attributes=_SLOW_ATTRS) as span:
+        delay = _SLOW_DELAY()
         span.set_attribute("delay.target_seconds", round(delay, 2))
         
         logger.warning("Starting slow operation", extra={
             "request_id": g.request_id,
-            "handler": "slow_endpoint",
             "expected_delay_seconds": round(delay, 2),
-            "warning_type": "latency"
+            **_SLOW_START_EXTRA
         })
         
-        span.add_event("slow_operation_start", {"target_delay": round(delay, 2)})
-        
-        # Simulate slow work in phases
+        # Simulate slow work in phases; the per-phase spans and logs are only worth their
+        # cost with OTEL_VERBOSE_SPANS, otherwise the whole delay is one sleep
         phases = 3
-        for i in range(phases):
-            with tracer.start_as_current_span(f"slow-phase-{i+1}") as phase_span:
-                phase_delay = delay / phases
-                phase_span.set_attribute("phase.number", i + 1)
-                phase_span.set_attribute("phase.delay", round(phase_delay, 3))
-                time.sleep(phase_delay)
-                
-                logger.debug(f"Slow operation phase {i+1} complete", extra={
-                    "request_id": g.request_id,
-                    "phase": i + 1,
-                    "phase_delay_seconds": round(phase_delay, 3)
-                })
-        
-        span.add_event("slow_operation_complete", {"actual_delay": round(delay, 2)})
-        
-        logger.warning("Slow operation completed", extra={
-            "request_id": g.request_id,
-            "handler": "slow_endpoint",
-            "actual_delay_seconds": round(delay, 2),
-            "warning_type": "latency_complete"
-        })
-        
-        return jsonify({
+        if _VERBOSE_SPANS:
+            phase_delay = delay / phases
+            phase_delay_rounded = round(phase_delay, 3)
+            for i in range(phases):
+                with _start(f"slow-phase-{i+1}") as phase_span:
+                    phase_span.set_attributes({
+                        "phase.number": i + 1,
+                        "phase.delay": phase_delay_rounded
+                    })
+                    if phase_span.is_recording():
+                        time.sleep(phase_delay)
+                    
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Slow operation phase {i+1} complete", extra={
+                            "request_id": g.request_id,
+                            "phase": i + 1,
+                            "phase_delay_seconds": phase_delay_rounded
+                        })
+        elif span.is_recording():
+            time.sleep(delay)
+        
+        g.log_summary = {"actual_delay_seconds": round(delay, 2)}
+        
+        return _json_response({
             "message": "Slow operation completed",
             "delay_seconds": round(delay, 2),
             "phases": phases,
@@ -803,78 +1260,60 @@ def slow_endpoint():
 @app.route("/error")
 def error_endpoint():
     """Error endpoint with comprehensive error tracing."""
-    with tracer.start_as_current_span("error-operation", kind=trace.SpanKind.INTERNAL) as span:
-        span.set_attribute("http.route", "/error")
-        span.set_attribute("error.simulated", True)
-        
-        logger.info("Processing error simulation request", extra={
-            "request_id": g.request_id,
-            "handler": "error_endpoint",
-            "action": "start"
-        })
-        
+    with _start("error-operation", kind=_INTERNAL, attributes=_ERROR_ATTRS) as span:
         try:
             # Simulate some work before error
-            with tracer.start_as_current_span("pre-error-work") as work_span:
-                time.sleep(random.uniform(0.01, 0.02))
-                work_span.add_event("work_in_progress")
+            with _maybe_span("pre-error-work") as work_span:
+                _simulate_work(work_span, _PRE_ERROR_DELAY)
                 
-                logger.debug("Pre-error processing", extra={
-                    "request_id": g.request_id,
-                    "stage": "pre_error"
-                })
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Pre-error processing", extra={
+                        "request_id": g.request_id,
+                        "stage": "pre_error"
+                    })
             
             # Simulate error
-            error_type = random.choice(["ValueError", "RuntimeError", "KeyError"])
-            span.set_attribute("error.type", error_type)
-            span.add_event("error_triggered", {"error_type": error_type})
-            
-            if error_type == "ValueError":
-                raise ValueError("Simulated validation error - invalid input data")
-            elif error_type == "RuntimeError":
-                raise RuntimeError("Simulated runtime error - service unavailable")
-            else:
-                raise KeyError("Simulated key error - missing configuration")
+            error_cls, error_msg = _rng.choice(_ERR_TABLE)
+            span.set_attribute("error.type", error_cls.__name__)
+            raise error_cls(error_msg)
                 
         except Exception as e:
             span.record_exception(e)
-            span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+            error_type = type(e).__name__
+            error_message = str(e)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, error_message))
             
             logger.error("Error occurred during request processing", extra={
                 "request_id": g.request_id,
                 "handler": "error_endpoint",
-                "error_type": type(e).__name__,
-                "error_message": str(e),
-                "status_code": 500
-            })
-            
-            logger.error("Error details for debugging", extra={
-                "request_id": g.request_id,
-                "exception_class": type(e).__name__,
+                "error_type": error_type,
+                "error_message": error_message,
+                "status_code": 500,
                 "exception_args": str(e.args),
                 "recovery_action": "retry_recommended"
             })
             
-            return jsonify({
-                "error": str(e),
-                "error_type": type(e).__name__,
+            return _json_response({
+                "error": error_message,
+                "error_type": error_type,
                 "request_id": g.request_id
-            }), 500
+            }, status=500)
 
 
 @app.route("/health")
 def health():
     """Health check with minimal logging."""
-    with tracer.start_as_current_span("health-check") as span:
-        span.set_attribute("health.status", "healthy")
-        return jsonify({"status": "healthy", "service": "sample-app"})
+    return Response(_HEALTH_JSON, mimetype="application/json")
 
 
 if __name__ == "__main__":
+    _init_telemetry()
+    # SIGTERM would otherwise kill the dev server without running atexit (and the flush)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     logger.info("Application starting", extra={
         "action": "startup",
-        "otlp_endpoint": otlp_endpoint,
-        "service": "sample-app",
+        "otlp_endpoint": _OTLP_ENDPOINT,
+        "service": _SERVICE_NAME,
         "version": "1.0.0"
     })
-    app.run(host="0.0.0.0", port=8080, debug=False)
+    app.run(host="0.0.0.0", port=8080, debug=False, use_reloader=False)